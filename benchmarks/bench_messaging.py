@@ -0,0 +1,127 @@
+"""
+Messaging throughput benchmarks run against the local service stand-ins.
+
+Measures throughput and p50/p99 latency for event publishing, concurrent node
+registration and callback reporting, no Dapr sidecar or remote service needed.
+
+    python benchmarks/bench_messaging.py --events 5000 --nodes 64 --latency 0.001
+"""
+
+import os
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from bud_ecosystem_utils.local_services import LocalDaprClient, LocalServiceServer
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))]
+
+
+def report(name, count, elapsed, latencies, extra=""):
+    print(
+        f"{name:<36} {count:>7} ops {count / elapsed:>10.1f} ops/s "
+        f"p50 {percentile(latencies, 50) * 1000:>8.3f} ms p99 {percentile(latencies, 99) * 1000:>8.3f} ms {extra}"
+    )
+
+
+def timed_calls(func, args_list, workers=1):
+    latencies = []
+    lock = threading.Lock()
+
+    def _call(args):
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(_call, args_list))
+    return time.perf_counter() - start, latencies
+
+
+def activity(idx):
+    return {"session_id": f"session-{idx % 8}", "node_type": "bench", "agent_id": "agent", "msg": f"message {idx}"}
+
+
+def bench_events(num_events, latency):
+    from bud_ecosystem_utils.event_utils import EventPublisher, publish_activity
+
+    client = LocalDaprClient(latency=latency)
+    elapsed, latencies = timed_calls(
+        lambda idx: publish_activity(client, activity(idx)), [(idx,) for idx in range(num_events)]
+    )
+    report("publish_activity (sync)", num_events, elapsed, latencies)
+
+    client = LocalDaprClient(latency=latency)
+    publisher = EventPublisher(client)
+    start = time.perf_counter()
+    _, latencies = timed_calls(
+        lambda idx: publisher.publish_activity(activity(idx)), [(idx,) for idx in range(num_events)]
+    )
+    publisher.close()
+    elapsed = time.perf_counter() - start
+    report("EventPublisher (enqueue + flush)", num_events, elapsed, latencies)
+
+
+def bench_register_node(num_nodes, latency, workers):
+    from bud_ecosystem_utils.node_utils import register_node, register_nodes
+
+    nodes = [{"name": f"node-{idx}", "type": "bench", "topic": f"topic-{idx}"} for idx in range(num_nodes)]
+
+    client = LocalDaprClient(latency=latency)
+    elapsed, latencies = timed_calls(
+        lambda node: register_node(client, node), [(node,) for node in nodes], workers=workers
+    )
+    report(f"register_node ({workers} concurrent)", num_nodes, elapsed, latencies, f"conflicts {client.conflicts}")
+
+    client = LocalDaprClient(latency=latency)
+    elapsed, latencies = timed_calls(lambda: register_nodes(client, nodes), [()])
+    report("register_nodes (single transaction)", num_nodes, elapsed, latencies, f"conflicts {client.conflicts}")
+
+
+def bench_callbacks(num_reports, server):
+    from bud_ecosystem_utils.callback_utils import CallbackReporter, report_to_callback
+
+    elapsed, latencies = timed_calls(
+        lambda idx: report_to_callback({"step": idx}, "bench"), [(idx,) for idx in range(num_reports)]
+    )
+    report("report_to_callback (sync)", num_reports, elapsed, latencies)
+
+    sent = len(server.callbacks)
+    reporter = CallbackReporter(coalesce_interval=0.05)
+    start = time.perf_counter()
+    _, latencies = timed_calls(
+        lambda idx: reporter.report({"step": idx}, "bench", terminal=idx == num_reports - 1),
+        [(idx,) for idx in range(num_reports)],
+    )
+    reporter.close()
+    elapsed = time.perf_counter() - start
+    report("CallbackReporter (coalesced)", num_reports, elapsed, latencies, f"posts {len(server.callbacks) - sent}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=2000, help="number of events to publish")
+    parser.add_argument("--nodes", type=int, default=64, help="number of nodes to register")
+    parser.add_argument("--workers", type=int, default=32, help="concurrent node registrations")
+    parser.add_argument("--callbacks", type=int, default=500, help="number of callback reports")
+    parser.add_argument("--latency", type=float, default=0.001, help="simulated round-trip in seconds")
+    args = parser.parse_args()
+
+    with LocalServiceServer(latency=args.latency) as server:
+        os.environ.update(server.environ())
+        bench_events(args.events, args.latency)
+        bench_register_node(args.nodes, args.latency, args.workers)
+        bench_callbacks(args.callbacks, server)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""
+Shared helpers for the asyncio variants of the utils.
+"""
+
+import os
+import asyncio
+
+
+DEFAULT_MAX_CONCURRENCY = int(os.environ.get("BUD_ASYNC_MAX_CONCURRENCY", 32))
+
+
+async def gather_with_concurrency(aws, max_concurrency: int = None, return_exceptions: bool = True):
+    """
+    Await `aws` with at most `max_concurrency` of them running at once.
+
+    Args:
+        aws (Iterable[Awaitable]): Coroutines to run.
+        max_concurrency (int): Maximum number of coroutines running at the same time.
+        return_exceptions (bool): Return raised exceptions in place of results instead of
+                                  propagating the first one.
+
+    Returns:
+        list: Results in the same order as `aws`.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency or DEFAULT_MAX_CONCURRENCY)
+
+    async def _run(aw):
+        async with semaphore:
+            return await aw
+
+    return list(
+        await asyncio.gather(*(_run(aw) for aw in aws), return_exceptions=return_exceptions)
+    )
@@ -5,20 +5,27 @@ import base64
 import logging
 from pathlib import Path
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 from smart_open import open
 
+from bud_ecosystem_utils.metrics import instrumented, record_bytes
+
 
 logging.getLogger("smart_open").setLevel(logging.CRITICAL)
 
+BLOB_SCHEMES = {"s3": "s3", "gs": "gcp", "azure": "azure"}
+DEFAULT_MAX_WORKERS = int(os.environ.get("BLOB_MAX_WORKERS", 16))
+
 
 class BlobService:
     def __init__(self, blob_provider="s3") -> None:
         self.blob_provider = os.environ.get("BLOB_PROVIDER", blob_provider)
         self.path = None
 
-    def get_s3_client(self):
+    def get_s3_client(self, max_connections=None):
         import boto3
+        from botocore.config import Config
 
         logging.getLogger("boto3").setLevel(logging.CRITICAL)
         logging.getLogger("botocore").setLevel(logging.CRITICAL)
@@ -29,7 +36,9 @@ class BlobService:
             aws_access_key_id=os.environ["AWS_ACCESS_KEY_ID"],
             aws_secret_access_key=os.environ["AWS_SECRET_ACCESS_KEY"],
         )
-        return session.client("s3")
+        # botocore keeps 10 connections by default, size the pool for concurrent transfers
+        config = Config(max_pool_connections=max(10, max_connections or 0))
+        return session.client("s3", config=config)
 
     def get_gcp_client(self):
         from google.cloud.storage import Client
@@ -51,12 +60,13 @@ class BlobService:
         azure_storage_connection_string = os.environ["AZURE_STORAGE_CONNECTION_STRING"]
         return BlobServiceClient.from_connection_string(azure_storage_connection_string)
 
-    def get_blob_client(self):
-        if self.blob_provider == "s3":
-            return self.get_s3_client()
-        elif self.blob_provider == "gcp":
+    def get_blob_client(self, blob_provider=None, max_connections=None):
+        blob_provider = blob_provider or self.blob_provider
+        if blob_provider == "s3":
+            return self.get_s3_client(max_connections=max_connections)
+        elif blob_provider == "gcp":
             return self.get_gcp_client()
-        elif self.blob_provider == "azure":
+        elif blob_provider == "azure":
             return self.get_azure_client()
         else:
             raise NotImplementedError(
@@ -75,6 +85,44 @@ class BlobService:
                 "Only supports the following providers at the moment: (s3, gcp, azure)"
             )
 
+    @staticmethod
+    def get_provider_from_url(blob_url):
+        scheme = blob_url.split("://")[0]
+        if scheme not in BLOB_SCHEMES:
+            raise NotImplementedError(
+                f"Only supports the following url schemes at the moment: {tuple(BLOB_SCHEMES.keys())}"
+            )
+        return BLOB_SCHEMES[scheme]
+
+    @staticmethod
+    def split_blob_url(blob_url):
+        bucket, _, key = blob_url.split("://", 1)[1].partition("/")
+        return bucket, key
+
+    def list_blobs(self, blob_url, client=None):
+        """
+        Yield the urls of every object under the `blob_url` prefix, following pagination.
+        """
+        blob_provider = self.get_provider_from_url(blob_url)
+        scheme = blob_url.split("://")[0]
+        bucket, prefix = self.split_blob_url(blob_url)
+        client = client or self.get_blob_client(blob_provider)
+
+        if blob_provider == "s3":
+            paginator = client.get_paginator("list_objects_v2")
+            for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+                for obj in page.get("Contents", []):
+                    yield f"{scheme}://{bucket}/{obj['Key']}"
+        elif blob_provider == "gcp":
+            for page in client.list_blobs(bucket, prefix=prefix).pages:
+                for blob in page:
+                    yield f"{scheme}://{bucket}/{blob.name}"
+        elif blob_provider == "azure":
+            container = client.get_container_client(bucket)
+            for page in container.list_blobs(name_starts_with=prefix).by_page():
+                for blob in page:
+                    yield f"{scheme}://{bucket}/{blob.name}"
+
     @staticmethod
     def create_zipfile_buffer_from_dir(
         basedir,
@@ -109,6 +157,7 @@ class BlobService:
             unique_key = base_key + "_" + unique_key
         return unique_key.replace("/", "")
 
+    @instrumented("blob.upload_file")
     def upload_file(self, key, content=None, filepath=None):
         if self.path is None:
             self.path = self.get_blob_path()
@@ -128,12 +177,14 @@ class BlobService:
             bytes_written = 0
             bytes_written += fout.write(content)
             print(f"Published {bytes_written} bytes to remote!!!")
+        record_bytes("blob.upload_file", bytes_written)
 
         del client
         return url
 
-    def download_file(self, blob_url, save_dir, extract_files=True):
-        client = self.get_blob_client()
+    @instrumented("blob.download_file")
+    def download_file(self, blob_url, save_dir, extract_files=True, client=None):
+        client = client or self.get_blob_client(self.get_provider_from_url(blob_url))
 
         savepath = os.path.join(save_dir, blob_url.split("/")[-1])
         Path(save_dir).mkdir(parents=True, exist_ok=True)
@@ -143,6 +194,7 @@ class BlobService:
                     fout.write(buffer)
 
         del client
+        record_bytes("blob.download_file", os.path.getsize(savepath))
 
         if savepath.endswith(".zip") and extract_files:
             filepath = savepath
@@ -159,6 +211,81 @@ class BlobService:
             os.remove(filepath)
         return savepath
 
+    def open_file(self, blob_url, client=None):
+        """Open a remote object for seekable, ranged reads."""
+        client = client or self.get_blob_client(self.get_provider_from_url(blob_url))
+        return open(blob_url, "rb", transport_params={"client": client})
+
+    @instrumented("blob.read_file")
+    def read_file(self, blob_url, client=None):
+        client = client or self.get_blob_client(self.get_provider_from_url(blob_url))
+        with open(blob_url, "rb", transport_params={"client": client}) as fin:
+            content = fin.read()
+        record_bytes("blob.read_file", len(content))
+        return content
+
+    @instrumented("blob.write_file")
+    def write_file(self, blob_url, content, client=None):
+        client = client or self.get_blob_client(self.get_provider_from_url(blob_url))
+        with open(blob_url, "wb", transport_params={"client": client}) as fout:
+            fout.write(content)
+        record_bytes("blob.write_file", len(content))
+        return blob_url
+
+    @instrumented("blob.delete_file")
+    def delete_file(self, blob_url, client=None):
+        blob_provider = self.get_provider_from_url(blob_url)
+        bucket, key = self.split_blob_url(blob_url)
+        client = client or self.get_blob_client(blob_provider)
+
+        if blob_provider == "s3":
+            client.delete_object(Bucket=bucket, Key=key)
+        elif blob_provider == "gcp":
+            client.bucket(bucket).blob(key).delete()
+        elif blob_provider == "azure":
+            client.get_blob_client(bucket, key).delete_blob()
+
+    @instrumented("blob.download_prefix")
+    def download_prefix(self, blob_url, save_dir, max_workers=None):
+        """
+        Download every object under the `blob_url` prefix into `save_dir` concurrently,
+        keeping the layout relative to the prefix. Returns the local directory.
+        """
+        prefix = blob_url.rstrip("/") + "/"
+        savepath = os.path.join(save_dir, prefix.rstrip("/").split("/")[-1])
+        max_workers = max_workers or DEFAULT_MAX_WORKERS
+        client = self.get_blob_client(self.get_provider_from_url(prefix), max_connections=max_workers)
+        urls = [url for url in self.list_blobs(prefix, client=client) if not url.endswith("/")]
+
+        def _download(url):
+            relpath = url[len(prefix):]
+            return self.download_file(
+                url,
+                os.path.join(savepath, os.path.dirname(relpath)),
+                extract_files=False,
+                client=client,
+            )
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for _ in tqdm(executor.map(_download, urls), total=len(urls)):
+                pass
+
+        del client
+        return savepath
+
+    def download(self, blob_url, save_dir, extract_files=True, max_workers=None):
+        """
+        Download `blob_url` treating it as a directory when it is a prefix of other objects
+        and as a single object otherwise.
+        """
+        client = self.get_blob_client(self.get_provider_from_url(blob_url))
+        is_prefix = blob_url.endswith("/") or next(
+            self.list_blobs(blob_url.rstrip("/") + "/", client=client), None
+        ) is not None
+        if is_prefix:
+            return self.download_prefix(blob_url, save_dir, max_workers=max_workers)
+        return self.download_file(blob_url, save_dir, extract_files=extract_files, client=client)
+
     def bulk_upload(self, basedir, base_key="", exclusions=None, zip_data=False):
         base_key = base_key.strip("/")
 
@@ -1,8 +1,32 @@
+import time
+import atexit
+import asyncio
+import logging
+import threading
 from typing import Any
 from os import environ
 import requests
 
+from bud_ecosystem_utils.async_utils import gather_with_concurrency
+from bud_ecosystem_utils.logger import setup_logger
+from bud_ecosystem_utils.metrics import instrumented, record_retry
+from bud_ecosystem_utils.payload_utils import pack_payload, pack_payload_async
 
+
+logger = setup_logger(__name__, logging.DEBUG)
+
+CALLBACK_MAX_CONNECTIONS = int(environ.get("CALLBACK_MAX_CONNECTIONS", 32))
+CALLBACK_COALESCE_INTERVAL = float(environ.get("CALLBACK_COALESCE_INTERVAL", 1))
+CALLBACK_MAX_RETRIES = int(environ.get("CALLBACK_MAX_RETRIES", 5))
+CALLBACK_BASE_BACKOFF = float(environ.get("CALLBACK_BASE_BACKOFF", 0.5))
+CALLBACK_TIMEOUT = float(environ.get("CALLBACK_TIMEOUT", 10))
+CALLBACK_CLOSE_TIMEOUT = float(environ.get("CALLBACK_CLOSE_TIMEOUT", 30))
+
+# id(loop) -> (loop, session, closer task), see `get_async_session`
+_async_sessions = {}
+
+
+@instrumented("callback.register_callback")
 def register_callback(session_id: str, node_id: str, node_type: str, cause: str):
     host = f"http://localhost:{environ['DAPR_HTTP_PORT']}"
     resp = requests.post(
@@ -14,11 +38,238 @@ def register_callback(session_id: str, node_id: str, node_type: str, cause: str)
     return resp.json()["id"]
 
 
-def report_to_callback(data: Any, cid: str):
+@instrumented("callback.report_to_callback")
+def report_to_callback(data: Any, cid: str, compact: bool = None, offload_threshold: int = None):
+    content, content_type = pack_payload(
+        {"data": data, "cid": cid}, compact=compact, offload_threshold=offload_threshold
+    )
     resp = requests.post(
         f"{environ['INTERNAL_ENDPOINT'].strip('/')}/internal/v1/callback",
-        headers={"content-type": "application/json"},
-        json={"data": data, "cid": cid}
+        headers={"content-type": content_type},
+        data=content
     )
     resp.raise_for_status()
     return resp.json()
+
+
+async def _close_on_shutdown(key, session):
+    # Runs until the loop cancels its pending tasks on shutdown (as `asyncio.run` does)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        entry = _async_sessions.get(key)
+        if entry is not None and entry[1] is session:
+            del _async_sessions[key]
+        await session.close()
+
+
+def get_async_session():
+    """
+    Return the aiohttp session shared by the async callbacks of the running event loop.
+
+    The session is closed when the loop shuts down or by `close_async_session`.
+    """
+    import aiohttp
+
+    loop = asyncio.get_running_loop()
+    # Forget sessions of loops that were closed without shutting their tasks down
+    for key, (_loop, _, _) in list(_async_sessions.items()):
+        if _loop.is_closed():
+            del _async_sessions[key]
+
+    entry = _async_sessions.get(id(loop))
+    if entry is None or entry[1].closed:
+        session = aiohttp.ClientSession(
+            headers={"content-type": "application/json"},
+            connector=aiohttp.TCPConnector(limit=CALLBACK_MAX_CONNECTIONS),
+        )
+        closer = loop.create_task(_close_on_shutdown(id(loop), session))
+        entry = _async_sessions[id(loop)] = (loop, session, closer)
+    return entry[1]
+
+
+async def close_async_session():
+    entry = _async_sessions.pop(id(asyncio.get_running_loop()), None)
+    if entry is not None:
+        _, session, closer = entry
+        closer.cancel()
+        await session.close()
+
+
+@instrumented("callback.register_callback")
+async def register_callback_async(session_id: str, node_id: str, node_type: str, cause: str, session=None):
+    session = session or get_async_session()
+    host = f"http://localhost:{environ['DAPR_HTTP_PORT']}"
+    async with session.post(
+        f"{host}/v1.0/invoke/workflow-manager/method/publish-workflow-callback",
+        json={"session_id": session_id, "node_id": node_id, "node_type": node_type, "cuase": cause}
+    ) as resp:
+        resp.raise_for_status()
+        return (await resp.json())["id"]
+
+
+@instrumented("callback.report_to_callback")
+async def report_to_callback_async(
+    data: Any, cid: str, session=None, compact: bool = None, offload_threshold: int = None
+):
+    session = session or get_async_session()
+    content, content_type = await pack_payload_async(
+        {"data": data, "cid": cid}, compact=compact, offload_threshold=offload_threshold
+    )
+    async with session.post(
+        f"{environ['INTERNAL_ENDPOINT'].strip('/')}/internal/v1/callback",
+        headers={"content-type": content_type},
+        data=content
+    ) as resp:
+        resp.raise_for_status()
+        return await resp.json()
+
+
+async def report_many_to_callback_async(reports: list, max_concurrency: int = None, session=None):
+    """
+    Send several `(data, cid)` reports concurrently, returns the responses or the
+    raised exceptions in the same order as `reports`.
+    """
+    session = session or get_async_session()
+    return await gather_with_concurrency(
+        (report_to_callback_async(data, cid, session=session) for data, cid in reports),
+        max_concurrency=max_concurrency,
+    )
+
+
+class CallbackReporter:
+    """
+    Report progress to the callback endpoint from a background thread.
+
+    Progress updates are coalesced per `cid`, only the latest update reported within
+    `coalesce_interval` seconds is sent. Terminal updates are never dropped, they supersede
+    any pending progress for their `cid` and are retried with exponential backoff. Pending
+    updates are flushed on `close` and at interpreter exit, waiting at most `close_timeout`
+    seconds so that an unresponsive endpoint can't keep the process from exiting.
+
+    Args:
+        endpoint (str): Base url of the callback service, defaults to `INTERNAL_ENDPOINT`.
+        coalesce_interval (float): Seconds between two sends.
+        max_retries (int): Retries for a terminal update before it is given up on.
+        timeout (float): Seconds to wait for the endpoint on every request.
+        close_timeout (float): Seconds `close` waits for pending updates to be sent.
+    """
+
+    def __init__(
+        self,
+        endpoint: str = None,
+        coalesce_interval: float = CALLBACK_COALESCE_INTERVAL,
+        max_retries: int = CALLBACK_MAX_RETRIES,
+        timeout: float = CALLBACK_TIMEOUT,
+        close_timeout: float = CALLBACK_CLOSE_TIMEOUT,
+    ) -> None:
+        endpoint = endpoint or environ["INTERNAL_ENDPOINT"]
+        self.url = f"{endpoint.strip('/')}/internal/v1/callback"
+        self.coalesce_interval = coalesce_interval
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.close_timeout = close_timeout
+        self.session = requests.Session()
+        self.session.headers.update({"content-type": "application/json"})
+
+        self._progress = {}
+        self._terminal = []
+        self._sending = False
+        self._closed = False
+        self._flush_requested = False
+        self._cond = threading.Condition()
+        self._worker = threading.Thread(target=self._run, name="CallbackReporter", daemon=True)
+        self._worker.start()
+        atexit.register(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def report(self, data: Any, cid: str, terminal: bool = False) -> None:
+        """
+        Queue an update for `cid` without blocking, `terminal` marks the final update
+        which is always delivered.
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Cannot report to a closed CallbackReporter")
+            if terminal:
+                self._progress.pop(cid, None)
+                self._terminal.append((data, cid))
+                self._cond.notify_all()
+            else:
+                self._progress[cid] = data
+
+    def flush(self) -> None:
+        """Block until every queued update has been sent."""
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._progress or self._terminal or self._sending:
+                self._cond.wait()
+
+    def close(self) -> None:
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._worker.join(self.close_timeout)
+        atexit.unregister(self.close)
+        if self._worker.is_alive():
+            logger.error(
+                f"CallbackReporter couldn't deliver pending updates within {self.close_timeout}s, giving up"
+            )
+            return
+        self.session.close()
+
+    @instrumented("callback.report_to_callback")
+    def _post(self, data, cid):
+        resp = self.session.post(self.url, json={"data": data, "cid": cid}, timeout=self.timeout)
+        resp.raise_for_status()
+        return resp.json()
+
+    def _send_terminal(self, data, cid):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self._post(data, cid)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error(f"Error in CallbackReporter, dropping final update for {cid}: {str(e)}")
+                    return
+                delay = CALLBACK_BASE_BACKOFF * 2 ** attempt
+                logger.warning(f"Error in CallbackReporter, retrying {cid} in {delay:.1f}s: {str(e)}")
+                record_retry("callback.report_to_callback")
+                time.sleep(delay)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.coalesce_interval
+                while not (self._closed or self._flush_requested or self._terminal):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                progress, self._progress = self._progress, {}
+                terminal, self._terminal = self._terminal, []
+                closed = self._closed
+                self._flush_requested = False
+                self._sending = True
+
+            for cid, data in progress.items():
+                try:
+                    self._post(data, cid)
+                except Exception as e:
+                    logger.warning(f"Error in CallbackReporter, skipping update for {cid}: {str(e)}")
+            for data, cid in terminal:
+                self._send_terminal(data, cid)
+
+            with self._cond:
+                self._sending = False
+                self._cond.notify_all()
+                if closed and not (self._progress or self._terminal):
+                    return
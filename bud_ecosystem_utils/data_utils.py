@@ -1,4 +1,5 @@
 import shutil
+import asyncio
 import zipfile
 import requests
 import json
@@ -6,12 +7,90 @@ import io
 import os
 
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from uuid import UUID
 from huggingface_hub import HfApi
 from huggingface_hub import DatasetFilter
 from urllib.parse import urljoin, quote_plus
 from tqdm import tqdm
 
+from bud_ecosystem_utils.async_utils import gather_with_concurrency
+from bud_ecosystem_utils.metrics import instrumented
+
+
+MODEL_FAMILIES = {"causal": 0, "sd1_5": 1, "sdxl": 2}
+MODEL_TYPES = {"adapter": 0, "delta": 1, "full": 2}
+REMOTE_SOURCE_SCHEMES = ["s3", "gs", "azure", "http", "https", "ftp", "sftp"]
+DEFAULT_MAX_CONCURRENCY = int(os.environ.get("BUD_MLOPS_MAX_CONCURRENCY", 8))
+
+
+def build_model_form(model_name: str, source: str, model_type: str, family: str, base_model_id: str = None):
+    if model_type not in MODEL_TYPES:
+        raise ValueError(f"Only supports model_type of the following {tuple(MODEL_TYPES.keys())}")
+    if family not in MODEL_FAMILIES:
+        raise ValueError(f"Only supports family of the following {tuple(MODEL_FAMILIES.keys())}")
+
+    if source.split("://")[0] in REMOTE_SOURCE_SCHEMES:
+        source_type = 2
+    else:
+        source_type = 0
+
+    return {
+        "name": model_name,
+        "source": source,
+        "type": MODEL_TYPES[model_type],
+        "source_type": source_type,
+        "family": MODEL_FAMILIES[family],
+        "base_model_id": base_model_id,
+    }
+
+
+def build_dataset_params(dataset_id=None, dataset_name=None):
+    params = {}
+    if dataset_id is not None:
+        params["dataset_id"] = dataset_id
+    if dataset_name is not None:
+        params["dataset_name"] = dataset_name
+    return params
+
+
+def parse_dataset_response(content):
+    if not content["status"]:
+        raise ValueError("Dataset fetching failed!!!")
+
+    dataset = content["data"]
+    if not len(dataset):
+        raise ValueError(f"Dataset doesn't exist")
+
+    return dataset[0]
+
+
+def build_dataset_archive(metadata_filepath: str, image_dirpath: str = None):
+    """
+    Validate the files of a dataset upload, returns its images archive as an in-memory
+    buffer or an open file, `None` for a dataset without images.
+    """
+    image_dirpath = image_dirpath or None
+
+    if not os.path.isfile(metadata_filepath):
+        raise FileNotFoundError(
+            f"Metedata file '{metadata_filepath}' doesn't exist."
+        )
+    if image_dirpath is None:
+        return None
+    if os.path.isfile(image_dirpath) and image_dirpath.endswith(".zip"):
+        return open(image_dirpath, "rb")
+    if not os.path.isdir(image_dirpath):
+        raise NotADirectoryError(
+            f"Image directory '{image_dirpath}' doesn't exist"
+        )
+    return create_zipfile_buffer_from_dir(image_dirpath).getbuffer()
+
+
+def bulk_result(data=None, error=None):
+    """Per-item outcome of a bulk request, `error` is set only when the item failed."""
+    return {"status": error is None, "data": data, "error": error}
+
 
 class BudMLOpsClient:
     def __init__(self, api_url: str = None, api_token: str = None) -> None:
@@ -30,6 +109,7 @@ class BudMLOpsClient:
             )
         self.session = sess
 
+    @instrumented("mlops.api_request")
     def api_request(self, method, path, raise_for_status=True, **kwargs):
         method = getattr(self.session, method)
         url = self.multi_urljoin(self.api_url, path)
@@ -46,23 +126,31 @@ class BudMLOpsClient:
             parts[0], "/".join(quote_plus(part.strip("/"), safe="/") for part in parts[1:])
         )
 
+    def _run_bulk(self, func, items, max_workers=None):
+        def _call(item):
+            try:
+                return bulk_result(data=func(**item))
+            except Exception as e:
+                return bulk_result(error=f"{type(e).__name__}: {e}")
+
+        max_workers = max_workers or DEFAULT_MAX_CONCURRENCY
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(_call, items))
+
     def fetch_dataset(self, dataset_id=None, dataset_name=None):
-        params = {}
-        if dataset_id is not None:
-            params["dataset_id"] = dataset_id
-        if dataset_name is not None:
-            params["dataset_name"] = dataset_name
         resp = self.api_request(
-            "get", "/dataset/", params=params
+            "get", "/dataset/", params=build_dataset_params(dataset_id, dataset_name)
         )
-        if not resp.json()["status"]:
-            raise ValueError("Dataset fetching failed!!!")
-
-        dataset = resp.json()["data"]
-        if not len(dataset):
-            raise ValueError(f"Dataset doesn't exist")
+        return parse_dataset_response(resp.json())
 
-        return dataset[0]
+    def fetch_datasets(self, dataset_ids=None, dataset_names=None, max_workers=None):
+        """
+        Fetch several datasets concurrently, returns one `bulk_result` per requested
+        dataset, ids first followed by names, in the order they were given.
+        """
+        items = [{"dataset_id": _id} for _id in dataset_ids or []]
+        items += [{"dataset_name": name} for name in dataset_names or []]
+        return self._run_bulk(self.fetch_dataset, items, max_workers=max_workers)
 
     def download_dataset(self, dataset_name: str, save_dir: str = None):
         dataset = self.fetch_dataset(dataset_name=dataset_name)
@@ -112,32 +200,8 @@ class BudMLOpsClient:
         self, dataset_name: str, metadata_filepath: str, image_dirpath: str = None
     ):
         source_type = 1
-        _type = 0
-        archive_file = None
-
-        image_dirpath = image_dirpath or None
-
-        if not os.path.isfile(metadata_filepath):
-            raise FileNotFoundError(
-                f"Metedata file '{metadata_filepath}' doesn't exist."
-            )
-        if image_dirpath:
-            if os.path.isfile(image_dirpath) and image_dirpath.endswith(".zip"):
-                archive_file = image_dirpath
-            elif not os.path.isdir(image_dirpath):
-                raise NotADirectoryError(
-                    f"Image directory '{image_dirpath}' doesn't exist"
-                )
-
-        if image_dirpath is not None and archive_file is None:
-            archive_file = create_zipfile_buffer_from_dir(
-                image_dirpath
-            ).getbuffer()
-        elif archive_file is not None:
-            archive_file = open(archive_file, "rb")
-
-        if archive_file is not None:
-            _type = 1
+        archive_file = build_dataset_archive(metadata_filepath, image_dirpath)
+        _type = 0 if archive_file is None else 1
 
         resp = self.api_request(
             "post",
@@ -158,33 +222,137 @@ class BudMLOpsClient:
         return resp.json()
 
     def register_model(self, model_name: str, source: str, model_type: str, family: str, base_model_id: str = None):
-        families = {"causal": 0, "sd1_5": 1, "sdxl": 2}
-        model_types = {"adapter": 0, "delta": 1, "full": 2}
-        if model_type not in model_types:
-            raise ValueError(f"Only supports model_type of the following {tuple(model_types.keys())}")
-        if family not in families:
-            raise ValueError(f"Only supports family of the following {tuple(families.keys())}")
-
-        if source.split("://")[0] in ["s3", "gs", "azure", "http", "https", "ftp", "sftp"]:
-            source_type = 2
-        else:
-            source_type = 0
-
+        form = build_model_form(model_name, source, model_type, family, base_model_id)
         resp = self.api_request(
             "post",
             "/models/",
-            files={
-                "name": (None, model_name),
-                "source": (None, source),
-                "type": (None, model_types[model_type]),
-                "source_type": (None, source_type),
-                "family": (None, families[family]),
-                "base_model_id": (None, base_model_id)
-            },
+            files={key: (None, value) for key, value in form.items()},
         )
         print("[INFO] Model succefully created")
         return resp.json()
 
+    def register_models(self, models: list, max_workers: int = None):
+        """
+        Register several models concurrently.
+
+        Each entry of `models` is a dict with the keyword arguments of `register_model`,
+        returns one `bulk_result` per entry in the same order.
+        """
+        return self._run_bulk(self.register_model, models, max_workers=max_workers)
+
+
+class AsyncBudMLOpsClient:
+    """
+    asyncio counterpart of `BudMLOpsClient` built on aiohttp.
+
+    Use as an async context manager or call `connect` / `close` explicitly.
+    Bulk calls run at most `max_concurrency` requests at a time.
+    """
+
+    def __init__(self, api_url: str = None, api_token: str = None, max_concurrency: int = None) -> None:
+        self.api_url = api_url or os.environ["BUD_MLOPS_API_URL"]
+        self.api_token = api_token or os.environ["BUD_MLOPS_API_TOKEN"]
+        self.max_concurrency = max_concurrency or DEFAULT_MAX_CONCURRENCY
+        self.session = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def connect(self):
+        import aiohttp
+
+        sess = aiohttp.ClientSession(
+            headers={"x-token": self.api_token},
+            connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+        )
+        try:
+            async with sess.get(BudMLOpsClient.multi_urljoin(self.api_url, "/ping")) as resp:
+                if resp.status != 200:
+                    content = await resp.text()
+                    raise ConnectionError(
+                        f"Server returned an invalid response [{resp.status}]: {content}"
+                    )
+        except BaseException:
+            await sess.close()
+            raise
+        self.session = sess
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    @instrumented("mlops.api_request")
+    async def api_request(self, method, path, raise_for_status=True, **kwargs):
+        url = BudMLOpsClient.multi_urljoin(self.api_url, path)
+        async with self.session.request(method, url, **kwargs) as resp:
+            if raise_for_status:
+                resp.raise_for_status()
+            return await resp.json()
+
+    async def _run_bulk(self, func, items):
+        async def _call(item):
+            try:
+                return bulk_result(data=await func(**item))
+            except Exception as e:
+                return bulk_result(error=f"{type(e).__name__}: {e}")
+
+        return await gather_with_concurrency(
+            (_call(item) for item in items), max_concurrency=self.max_concurrency
+        )
+
+    async def fetch_dataset(self, dataset_id=None, dataset_name=None):
+        content = await self.api_request(
+            "get", "/dataset/", params=build_dataset_params(dataset_id, dataset_name)
+        )
+        return parse_dataset_response(content)
+
+    async def fetch_datasets(self, dataset_ids=None, dataset_names=None):
+        items = [{"dataset_id": _id} for _id in dataset_ids or []]
+        items += [{"dataset_name": name} for name in dataset_names or []]
+        return await self._run_bulk(self.fetch_dataset, items)
+
+    async def upload_dataset(
+        self, dataset_name: str, metadata_filepath: str, image_dirpath: str = None
+    ):
+        import aiohttp
+
+        # Zipping the images directory blocks, keep it off the event loop
+        archive_file = await asyncio.to_thread(build_dataset_archive, metadata_filepath, image_dirpath)
+        metadata_file = open(metadata_filepath, "rb")
+        try:
+            data = aiohttp.FormData()
+            data.add_field(
+                "metadata_file", metadata_file, filename="metadata" + Path(metadata_filepath).suffix
+            )
+            if archive_file is not None:
+                data.add_field("archive_file", archive_file, filename="images.zip")
+            data.add_field("name", dataset_name)
+            data.add_field("source_type", "1")
+            data.add_field("type", "0" if archive_file is None else "1")
+            return await self.api_request("post", "/dataset/", data=data)
+        finally:
+            metadata_file.close()
+            if hasattr(archive_file, "close"):
+                archive_file.close()
+
+    async def register_model(self, model_name: str, source: str, model_type: str, family: str, base_model_id: str = None):
+        import aiohttp
+
+        form = build_model_form(model_name, source, model_type, family, base_model_id)
+        data = aiohttp.FormData()
+        for key, value in form.items():
+            if value is not None:
+                data.add_field(key, str(value))
+        return await self.api_request("post", "/models/", data=data)
+
+    async def register_models(self, models: list):
+        return await self._run_bulk(self.register_model, models)
+
 
 def create_zipfile_buffer_from_dir(basedir, exclusions=None):
     zip_bytes_io = io.BytesIO()
@@ -309,17 +477,38 @@ def download_dataset(dataset_name_or_id, **kwargs):
         dataset = mlops_client.fetch_dataset(dataset_id=dataset_name_or_id)
         dataset_name_or_id = dataset["source"]
 
+    from bud_ecosystem_utils.blob import BlobService, BLOB_SCHEMES
+
+    cache_dir = os.path.join(Path.home(), ".cache", "bud_ecosystem")
+    is_blob_url = dataset_name_or_id.split("://")[0] in BLOB_SCHEMES
     if does_dataset_exist_in_hf_hub(dataset_name_or_id):
         return dataset_name_or_id, "hf"
-    elif dataset_name_or_id.startswith("s3://"):
-        from bud_ecosystem_utils.blob import BlobService
+    elif is_blob_url and dataset_name_or_id.endswith("manifest.json"):
+        from bud_ecosystem_utils.shard_utils import download_sharded_dataset
+        save_dir = os.path.join(cache_dir, dataset_name_or_id.rstrip("/").split("/")[-2])
+        return download_sharded_dataset(dataset_name_or_id, save_dir), "sharded"
+    elif is_blob_url:
         blob_service = BlobService()
-        savepath = blob_service.download_file(dataset_name_or_id, os.path.join(Path.home(), ".cache", "bud_ecosystem"))
+        savepath = blob_service.download(
+            dataset_name_or_id, cache_dir, max_workers=kwargs.get("max_workers")
+        )
     else:
-        raise NotImplementedError("Only supports Hugging Face and AWS S3 datasets")
+        raise NotImplementedError(
+            f"Only supports Hugging Face and blob storage {tuple(BLOB_SCHEMES.keys())} datasets"
+        )
 
     if "image_column" in kwargs:
-        extract_and_process_image_archives(savepath)
+        extract_and_process_image_archives(savepath, kwargs["image_column"])
+
+    if kwargs.get("pack_shards"):
+        from bud_ecosystem_utils.shard_utils import pack_dataset
+        savepath = pack_dataset(
+            savepath,
+            savepath.rstrip("/") + "_sharded",
+            image_column=kwargs.get("image_column"),
+            shard_size=kwargs.get("shard_size"),
+        )
+        return savepath, "sharded"
 
     return savepath, "local"
 
@@ -1,7 +1,16 @@
 import json
 import os
+import time
+import random
+import queue
+import atexit
 import logging
+import threading
 from dapr.clients import DaprClient
+from dapr.aio.clients import DaprClient as AsyncDaprClient
+from bud_ecosystem_utils.async_utils import gather_with_concurrency
+from bud_ecosystem_utils.metrics import instrumented, record_retry
+from bud_ecosystem_utils.payload_utils import JSON_CONTENT_TYPE, pack_payload, pack_payload_async
 from bud_ecosystem_utils.logger import setup_logger
 
 
@@ -11,14 +20,44 @@ EVENT_PUBSUB_NAME = os.getenv("EVENT_PUBSUB_NAME", "bud-redis-queue")
 EVENT_PUBSUB_TOPIC = os.getenv("EVENT_PUBSUB_TOPIC", "activities")
 RESULT_TOPIC = os.getenv("RESULT_TOPIC", "output-aggregator")
 CLIENT_TOPIC = os.getenv("RESULT_TOPIC", "client-error")
+EVENT_BATCH_SIZE = int(os.getenv("EVENT_BATCH_SIZE", 100))
+EVENT_FLUSH_INTERVAL = float(os.getenv("EVENT_FLUSH_INTERVAL", 0.05))
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", 10000))
+EVENT_MAX_RETRIES = int(os.getenv("EVENT_MAX_RETRIES", 5))
+EVENT_BASE_BACKOFF = float(os.getenv("EVENT_BASE_BACKOFF", 0.1))
 
+
+def build_client_error(event: dict) -> dict:
+    return {
+        "session_id": event['session_id'],
+        "status": "error",
+        "data": event["data"],
+    }
+
+
+def build_result(event: dict) -> dict:
+    return {
+        "session_id": event['session_id'],
+        "node_id": event["node_id"],
+        "status": event["status"],
+        "node_type":  event["node_type"],
+        "data": event["data"],
+    }
+
+
+def build_activity(event: dict) -> dict:
+    return {
+        "session_id": event['session_id'],
+        "from": event["node_type"],
+        "agent_id": event["agent_id"],
+        "msg": event["msg"],
+    }
+
+
+@instrumented("event.publish_error_to_client")
 def publish_error_to_client(client: DaprClient, event: dict) -> None:
     try:
-        payload = {
-            "session_id": event['session_id'],
-            "status": "error",
-            "data": event["data"],
-        }
+        payload = build_client_error(event)
         client.publish_event(
             pubsub_name=EVENT_PUBSUB_NAME,
             topic_name=CLIENT_TOPIC,
@@ -30,26 +69,34 @@ def publish_error_to_client(client: DaprClient, event: dict) -> None:
         logger.error(f"Error in send_response: {e}")
         raise e
     
-def publish_result(client: DaprClient, event: dict) -> None:
+@instrumented("event.publish_result")
+def publish_result(client: DaprClient, event: dict, compact: bool = None, offload_threshold: int = None) -> None:
+    """
+    Publish a result to the Dapr pub/sub component.
+
+    Args:
+        client (DaprClient): The Dapr client instance.
+        event (dict): The event to publish.
+        compact (bool): Use the compact binary encoding, see `payload_utils`.
+        offload_threshold (int): Size in bytes above which the data is stored in blob
+                                 storage and only a reference is published.
+    """
     try:
-        payload = {
-            "session_id": event['session_id'],
-            "node_id": event["node_id"],
-            "status": event["status"],
-            "node_type":  event["node_type"],
-            "data": event["data"],
-        }
+        data, content_type = pack_payload(
+            build_result(event), compact=compact, offload_threshold=offload_threshold
+        )
         client.publish_event(
             pubsub_name=EVENT_PUBSUB_NAME,
             topic_name=RESULT_TOPIC,
-            data=json.dumps(payload),
-            data_content_type="application/json",
+            data=data,
+            data_content_type=content_type,
         )
         logger.info("Response Sent Successfully")
     except Exception as e:
         logger.error(f"Error in send_response: {e}")
         raise e
 
+@instrumented("event.publish_activity")
 def publish_activity(client: DaprClient, event: dict) -> None :
     """
     Publish an activity to the Dapr pub/sub component.
@@ -59,21 +106,286 @@ def publish_activity(client: DaprClient, event: dict) -> None :
         event (dict): The event to publish.
     """
     try:
-        
-        activity = {
-            "session_id": event['session_id'],
-            "from": event["node_type"],
-            "agent_id": event["agent_id"],
-            "msg": event["msg"],
-        }
-        
+        activity = build_activity(event)
+
         client.publish_event(
             pubsub_name=EVENT_PUBSUB_NAME,
             topic_name=EVENT_PUBSUB_TOPIC,
             data=json.dumps(activity),
             data_content_type="application/json",
         )
-        logger.info(f"Published event: {activity}")
+        logger.debug(f"Published event for session {activity['session_id']}")
     except Exception as e:
         logger.error(f"Error in publish_activity: {str(e)}")
         raise e
+
+
+async def _publish_event_async(
+    client: AsyncDaprClient, topic: str, payload: dict, compact: bool = False, offload_threshold: int = 0
+) -> None:
+    data, content_type = await pack_payload_async(payload, compact=compact, offload_threshold=offload_threshold)
+    await client.publish_event(
+        pubsub_name=EVENT_PUBSUB_NAME,
+        topic_name=topic,
+        data=data,
+        data_content_type=content_type,
+    )
+
+
+@instrumented("event.publish_error_to_client")
+async def publish_error_to_client_async(client: AsyncDaprClient, event: dict) -> None:
+    """asyncio counterpart of `publish_error_to_client` using Dapr's async client."""
+    try:
+        await _publish_event_async(client, CLIENT_TOPIC, build_client_error(event))
+        logger.debug("Response Sent Successfully")
+    except Exception as e:
+        logger.error(f"Error in publish_error_to_client_async: {e}")
+        raise e
+
+
+@instrumented("event.publish_result")
+async def publish_result_async(
+    client: AsyncDaprClient, event: dict, compact: bool = None, offload_threshold: int = None
+) -> None:
+    """asyncio counterpart of `publish_result` using Dapr's async client."""
+    try:
+        await _publish_event_async(
+            client, RESULT_TOPIC, build_result(event), compact=compact, offload_threshold=offload_threshold
+        )
+        logger.debug("Response Sent Successfully")
+    except Exception as e:
+        logger.error(f"Error in publish_result_async: {e}")
+        raise e
+
+
+@instrumented("event.publish_activity")
+async def publish_activity_async(client: AsyncDaprClient, event: dict) -> None:
+    """asyncio counterpart of `publish_activity` using Dapr's async client."""
+    try:
+        activity = build_activity(event)
+        await _publish_event_async(client, EVENT_PUBSUB_TOPIC, activity)
+        logger.debug(f"Published event for session {activity['session_id']}")
+    except Exception as e:
+        logger.error(f"Error in publish_activity_async: {str(e)}")
+        raise e
+
+
+async def publish_many_async(
+    client: AsyncDaprClient,
+    events: list,
+    publish=publish_activity_async,
+    max_concurrency: int = None,
+) -> list:
+    """
+    Publish several events concurrently.
+
+    Args:
+        client (AsyncDaprClient): The async Dapr client instance.
+        events (list): The events to publish.
+        publish (Callable): One of the `publish_*_async` functions, defaults to activities.
+        max_concurrency (int): Maximum number of publishes in flight.
+
+    Returns:
+        list: `None` for each published event or the exception it raised, in order.
+    """
+    return await gather_with_concurrency(
+        (publish(client, event) for event in events), max_concurrency=max_concurrency
+    )
+
+
+class EventPublisher:
+    """
+    Queue events in memory and publish them from a background thread using Dapr's bulk publish.
+
+    A batch is flushed once it holds `max_batch_size` events or `flush_interval` seconds
+    after its first event was queued. Batches are published by a single worker in the order
+    they were queued. `publish` blocks when the queue is full and the queue is flushed on
+    `close` and at interpreter exit.
+
+    Within a batch, ordering is up to the pub/sub component: Dapr's default bulk publisher
+    (used by Redis among others) sends the entries of a bulk request in parallel, so events
+    of a session sharing a batch may be delivered out of order. Use `max_batch_size=1`
+    where strict per-session ordering is required.
+
+    Events that fail to publish are retried with jittered exponential backoff, together
+    with the later events of their session in the batch so that these are delivered again
+    after them (delivery is at-least-once). Once the retries are exhausted they are
+    counted in `failed` and handed to `on_error`.
+
+    Args:
+        client (DaprClient): The Dapr client instance.
+        max_batch_size (int): Maximum number of events per bulk publish.
+        flush_interval (float): Maximum time in seconds an event waits before being flushed.
+        max_queue_size (int): Maximum number of queued events before `publish` blocks.
+        max_retries (int): Retries for events that failed to publish.
+        on_error (Callable): Called from the worker with `(topic, payloads, error)` for
+                             events given up on.
+    """
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        client: DaprClient,
+        max_batch_size: int = EVENT_BATCH_SIZE,
+        flush_interval: float = EVENT_FLUSH_INTERVAL,
+        max_queue_size: int = EVENT_QUEUE_SIZE,
+        max_retries: int = EVENT_MAX_RETRIES,
+        on_error=None,
+    ) -> None:
+        self.client = client
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.on_error = on_error
+        self.failed = 0
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.closed = False
+        self.worker = threading.Thread(target=self._run, name="EventPublisher", daemon=True)
+        self.worker.start()
+        atexit.register(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def publish(self, topic: str, payload: dict, block: bool = True, timeout: float = None) -> None:
+        """
+        Queue a payload for `topic`, raises `queue.Full` if it couldn't be queued in time.
+        """
+        self._put(topic, payload, None, block=block, timeout=timeout)
+
+    def _put(self, topic, payload, pack_options, block=True, timeout=None):
+        if self.closed:
+            raise RuntimeError("Cannot publish to a closed EventPublisher")
+        self.queue.put((topic, payload, pack_options), block=block, timeout=timeout)
+
+    def publish_activity(self, event: dict, **kwargs) -> None:
+        self.publish(EVENT_PUBSUB_TOPIC, build_activity(event), **kwargs)
+
+    def publish_result(self, event: dict, compact: bool = None, offload_threshold: int = None, **kwargs) -> None:
+        # Encoding and offloading to blob storage happen in the worker, off the caller's thread
+        pack_options = {"compact": compact, "offload_threshold": offload_threshold}
+        self._put(RESULT_TOPIC, build_result(event), pack_options, **kwargs)
+
+    def publish_error_to_client(self, event: dict, **kwargs) -> None:
+        self.publish(CLIENT_TOPIC, build_client_error(event), **kwargs)
+
+    def flush(self) -> None:
+        """Block until every queued event has been published or given up on, see `failed`."""
+        self.queue.join()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(self._STOP)
+        self.worker.join()
+        atexit.unregister(self.close)
+
+    def _next_batch(self):
+        item = self.queue.get()
+        batch = [item]
+        deadline = time.monotonic() + self.flush_interval
+        while item is not self._STOP and len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+        return batch
+
+    @instrumented("event.publish_bulk")
+    def _publish_bulk(self, topic, data, content_type):
+        """Bulk publish `data`, returns the indices of the entries that failed and the error."""
+        try:
+            resp = self.client.publish_events(
+                pubsub_name=EVENT_PUBSUB_NAME,
+                topic_name=topic,
+                data=data,
+                data_content_type=content_type,
+            )
+        except Exception as e:
+            return list(range(len(data))), str(e)
+        # Entry ids are the positions of the events in the published list
+        failed = [int(entry.entry_id) for entry in resp.failed_entries]
+        return failed, resp.failed_entries[0].error if failed else None
+
+    def _give_up(self, topic, payloads, error):
+        self.failed += len(payloads)
+        logger.error(f"Error in EventPublisher, dropping {len(payloads)} events to {topic}: {error}")
+        if self.on_error is not None:
+            try:
+                self.on_error(topic, payloads, error)
+            except Exception as e:
+                logger.error(f"Error in EventPublisher on_error callback: {str(e)}")
+
+    def _pack(self, topic, items):
+        """Encode the queued items, returns runs of consecutive events sharing a content type."""
+        runs = []
+        for payload, pack_options in items:
+            if pack_options is None:
+                data, content_type = json.dumps(payload), JSON_CONTENT_TYPE
+            else:
+                try:
+                    data, content_type = pack_payload(payload, **pack_options)
+                except Exception as e:
+                    self._give_up(topic, [payload], str(e))
+                    continue
+            if not runs or runs[-1][0] != content_type:
+                runs.append((content_type, [], []))
+            runs[-1][1].append(payload)
+            runs[-1][2].append(data)
+        return runs
+
+    @staticmethod
+    def _retry_indices(payloads, failed):
+        """Indices of the failed events and of every later event of the same sessions."""
+        failed = set(failed)
+        sessions = set()
+        retry = []
+        for idx, payload in enumerate(payloads):
+            session_id = payload.get("session_id")
+            if idx in failed or session_id in sessions:
+                sessions.add(session_id)
+                retry.append(idx)
+        return retry
+
+    def _send(self, topic, payloads, data, content_type):
+        for attempt in range(self.max_retries + 1):
+            failed, error = self._publish_bulk(topic, data, content_type)
+            if not failed:
+                logger.debug(f"Published {len(data)} events to {topic}")
+                return
+            retry = self._retry_indices(payloads, failed)
+            payloads = [payloads[idx] for idx in retry]
+            data = [data[idx] for idx in retry]
+            if attempt < self.max_retries:
+                delay = random.uniform(0, EVENT_BASE_BACKOFF * 2 ** attempt)
+                logger.warning(f"Failed to publish {len(data)} events to {topic}, retrying in {delay:.3f}s: {error}")
+                record_retry("event.publish_bulk")
+                time.sleep(delay)
+
+        self._give_up(topic, payloads, error)
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch = self._next_batch()
+            topics = {}
+            for item in batch:
+                if item is self._STOP:
+                    stop = True
+                    continue
+                topic, payload, pack_options = item
+                topics.setdefault(topic, []).append((payload, pack_options))
+            for topic, items in topics.items():
+                for content_type, payloads, data in self._pack(topic, items):
+                    self._send(topic, payloads, data, content_type)
+            for _ in batch:
+                self.queue.task_done()
@@ -0,0 +1,251 @@
+"""
+In-process stand-ins for the services the utils talk to.
+
+`LocalDaprClient` replaces the Dapr sidecar for pub/sub and an etag-aware state store,
+`LocalServiceServer` is a local HTTP server answering the MLOps API (`/ping`, `/dataset/`,
+`/models/`), the workflow-manager callback registration and `/internal/v1/callback`.
+Both can add an artificial latency to every call to approximate a network round-trip,
+they are meant for offline load tests and benchmarks.
+"""
+
+import json
+import time
+import uuid
+import threading
+from types import SimpleNamespace
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bud_ecosystem_utils.payload_utils import COMPACT_CONTENT_TYPE, decode
+
+
+class EtagMismatchError(Exception):
+    pass
+
+
+class LocalDaprClient:
+    """
+    Thread-safe stand-in for `DaprClient` covering pub/sub and the state store.
+
+    Every save bumps the etag of its key, a save or transaction carrying an etag that
+    doesn't match the stored one fails with `EtagMismatchError` like a first-write
+    conflict in Dapr. As with Dapr, a first-write save without an etag only succeeds
+    if the key doesn't exist yet.
+
+    Args:
+        latency (float): Seconds slept on every call to simulate the sidecar round-trip.
+    """
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.published = {}
+        self.state = {}
+        self.conflicts = 0
+        self._lock = threading.Lock()
+
+    def _sleep(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        pass
+
+    def publish_event(self, pubsub_name, topic_name, data, data_content_type=None, **kwargs):
+        self._sleep()
+        with self._lock:
+            self.published.setdefault(topic_name, []).append(data)
+
+    def publish_events(self, pubsub_name, topic_name, data, data_content_type=None, **kwargs):
+        self._sleep()
+        with self._lock:
+            self.published.setdefault(topic_name, []).extend(data)
+        return SimpleNamespace(failed_entries=[])
+
+    def _state_item(self, key):
+        data, etag = self.state.get(key, (b"", ""))
+        return SimpleNamespace(key=key, data=data, etag=etag)
+
+    def _check_etag(self, key, etag, first_write=False):
+        if etag:
+            conflict = self.state.get(key, (b"", ""))[1] != etag
+        else:
+            conflict = first_write and key in self.state
+        if conflict:
+            self.conflicts += 1
+            raise EtagMismatchError(f"possible etag mismatch for key {key}")
+
+    def _write(self, key, value):
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        etag = str(int(self.state.get(key, (b"", "0"))[1] or 0) + 1)
+        self.state[key] = (value, etag)
+
+    def get_state(self, store_name, key, **kwargs):
+        self._sleep()
+        with self._lock:
+            return self._state_item(key)
+
+    def get_bulk_state(self, store_name, keys, **kwargs):
+        self._sleep()
+        with self._lock:
+            return SimpleNamespace(items=[self._state_item(key) for key in keys])
+
+    def save_state(self, store_name, key, value, etag=None, options=None, state_metadata=None, **kwargs):
+        self._sleep()
+        concurrency = getattr(options, "concurrency", None)
+        first_write = getattr(concurrency, "name", concurrency) == "first_write"
+        with self._lock:
+            self._check_etag(key, etag, first_write=first_write)
+            self._write(key, value)
+
+    def execute_state_transaction(self, store_name, operations, **kwargs):
+        self._sleep()
+        with self._lock:
+            for op in operations:
+                self._check_etag(op.key, op.etag)
+            for op in operations:
+                if getattr(op.operation_type, "name", op.operation_type) == "delete":
+                    self.state.pop(op.key, None)
+                else:
+                    self._write(op.key, op.data)
+
+
+class _ServiceHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, content, status=200):
+        body = json.dumps(content).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_form(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        content_type = self.headers.get("Content-Type", "")
+        if content_type.startswith("multipart/form-data"):
+            message = BytesParser(policy=default_policy).parsebytes(
+                f"Content-Type: {content_type}\r\n\r\n".encode("utf-8") + body
+            )
+            return {
+                part.get_param("name", header="content-disposition"): part.get_content()
+                for part in message.iter_parts()
+            }
+        if content_type.startswith("application/json"):
+            return json.loads(body or b"{}")
+        if content_type.startswith(COMPACT_CONTENT_TYPE):
+            return decode(body, COMPACT_CONTENT_TYPE)
+        return {key: values[-1] for key, values in parse_qs(body.decode("utf-8")).items()}
+
+    def do_GET(self):
+        server = self.server.service
+        server._sleep()
+        url = urlparse(self.path)
+        if url.path == "/ping":
+            return self._send_json({"status": True})
+        if url.path == "/dataset/":
+            params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            with server.lock:
+                datasets = [
+                    dataset
+                    for dataset in server.datasets
+                    if all(dataset.get(key) == value for key, value in params.items())
+                ]
+            return self._send_json({"status": True, "data": datasets})
+        self._send_json({"detail": "Not Found"}, status=404)
+
+    def do_POST(self):
+        server = self.server.service
+        server._sleep()
+        path = urlparse(self.path).path
+        form = self._read_form()
+        if path == "/models/":
+            model = dict(form, model_id=str(uuid.uuid4()))
+            with server.lock:
+                server.models.append(model)
+            return self._send_json({"status": True, "data": model})
+        if path == "/internal/v1/callback":
+            with server.lock:
+                server.callbacks.append(form)
+            return self._send_json({"status": True})
+        if path == "/v1.0/invoke/workflow-manager/method/publish-workflow-callback":
+            cid = str(uuid.uuid4())
+            with server.lock:
+                server.registered_callbacks[cid] = form
+            return self._send_json({"id": cid})
+        self._send_json({"detail": "Not Found"}, status=404)
+
+
+class LocalServiceServer:
+    """
+    Local HTTP server standing in for the MLOps API and the callback endpoints.
+
+    Point `BUD_MLOPS_API_URL`, `INTERNAL_ENDPOINT` and `DAPR_HTTP_PORT` at it, for
+    instance with `LocalServiceServer().start().environ()`.
+
+    Args:
+        latency (float): Seconds slept on every request to simulate a network round-trip.
+        datasets (list): Datasets returned by `/dataset/`, filtered on the query params.
+        port (int): Port to listen on, a free one is picked by default.
+    """
+
+    def __init__(self, latency: float = 0.0, datasets: list = None, port: int = 0) -> None:
+        self.latency = latency
+        self.datasets = list(datasets or [])
+        self.models = []
+        self.callbacks = []
+        self.registered_callbacks = {}
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), _ServiceHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.service = self
+        self._thread = None
+
+    def _sleep(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    @property
+    def port(self):
+        return self.httpd.server_address[1]
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def environ(self) -> dict:
+        """Environment variables pointing the utils at this server."""
+        return {
+            "BUD_MLOPS_API_URL": self.url,
+            "BUD_MLOPS_API_TOKEN": "local",
+            "INTERNAL_ENDPOINT": self.url,
+            "DAPR_HTTP_PORT": str(self.port),
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="LocalServiceServer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,242 @@
+"""
+Performance instrumentation for the blob, MLOps and messaging utils.
+
+Operations record their latency, in-flight count, errors, retries and bytes
+transferred into an in-process registry that can be rendered in the Prometheus
+text format. When `BUD_APM_SPANS` is set, every tracked operation is also captured
+through the `apm_client` set up in `logger.py`, as a span of the active transaction
+or as a transaction of its own when there is none.
+
+Instrumentation is disabled unless `BUD_METRICS_ENABLED` is set, while disabled
+the tracking helpers return immediately.
+"""
+
+import os
+import time
+import bisect
+import inspect
+import threading
+import functools
+from contextlib import contextmanager
+
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _env_flag(name):
+    return os.environ.get(name, "").lower() in ("1", "true", "yes")
+
+
+class MetricsRegistry:
+    """
+    Thread-safe store of counters, gauges and histograms keyed by name and labels.
+    """
+
+    def __init__(self, enabled: bool = False, apm_spans: bool = False, buckets=DEFAULT_BUCKETS) -> None:
+        self.enabled = enabled
+        self.apm_spans = apm_spans
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def add_gauge(self, name: str, value: float, **labels) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(self.buckets), 0, 0.0]
+            idx = bisect.bisect_left(self.buckets, value)
+            if idx < len(self.buckets):
+                histogram[0][idx] += 1
+            histogram[1] += 1
+            histogram[2] += value
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    @staticmethod
+    def _format_labels(labels, extra=()):
+        labels = tuple(labels) + tuple(extra)
+        if not labels:
+            return ""
+        return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+    def render_prometheus(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for kind, store in (("counter", self._counters), ("gauge", self._gauges)):
+                for name in sorted({name for name, _ in store}):
+                    lines.append(f"# TYPE {name} {kind}")
+                    for (_name, labels), value in store.items():
+                        if _name == name:
+                            lines.append(f"{name}{self._format_labels(labels)} {value}")
+
+            for name in sorted({name for name, _ in self._histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (_name, labels), (counts, count, total) in self._histograms.items():
+                    if _name != name:
+                        continue
+                    cumulative = 0
+                    for bucket, bucket_count in zip(self.buckets, counts):
+                        cumulative += bucket_count
+                        lines.append(
+                            f"{name}_bucket{self._format_labels(labels, [('le', bucket)])} {cumulative}"
+                        )
+                    lines.append(f"{name}_bucket{self._format_labels(labels, [('le', '+Inf')])} {count}")
+                    lines.append(f"{name}_count{self._format_labels(labels)} {count}")
+                    lines.append(f"{name}_sum{self._format_labels(labels)} {total}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry(
+    enabled=_env_flag("BUD_METRICS_ENABLED"),
+    apm_spans=_env_flag("BUD_APM_SPANS"),
+)
+
+
+def configure(enabled: bool = None, apm_spans: bool = None) -> MetricsRegistry:
+    """Enable or disable instrumentation at runtime, returns the global registry."""
+    if enabled is not None:
+        METRICS.enabled = enabled
+    if apm_spans is not None:
+        METRICS.apm_spans = apm_spans
+    return METRICS
+
+
+def record_bytes(operation: str, num_bytes: int, **labels) -> None:
+    if METRICS.enabled and num_bytes:
+        METRICS.inc("bud_bytes_transferred_total", num_bytes, operation=operation, **labels)
+
+
+def record_retry(operation: str, **labels) -> None:
+    if METRICS.enabled:
+        METRICS.inc("bud_operation_retries_total", operation=operation, **labels)
+
+
+@contextmanager
+def _apm_span(operation):
+    import elasticapm
+    from bud_ecosystem_utils.logger import apm_client
+
+    if elasticapm.get_transaction_id() is not None:
+        with elasticapm.capture_span(operation, span_type="bud", span_subtype=operation.split(".")[0]):
+            yield
+        return
+
+    # Background threads and training loops have no transaction for the span to join
+    apm_client.begin_transaction("bud")
+    result = "success"
+    try:
+        yield
+    except BaseException:
+        result = "failure"
+        raise
+    finally:
+        apm_client.end_transaction(operation, result)
+
+
+@contextmanager
+def _track(operation, labels):
+    METRICS.add_gauge("bud_operation_in_flight", 1, operation=operation, **labels)
+    start = time.perf_counter()
+    try:
+        if METRICS.apm_spans:
+            with _apm_span(operation):
+                yield
+        else:
+            yield
+    except BaseException:
+        METRICS.inc("bud_operation_errors_total", operation=operation, **labels)
+        raise
+    finally:
+        METRICS.observe("bud_operation_seconds", time.perf_counter() - start, operation=operation, **labels)
+        METRICS.add_gauge("bud_operation_in_flight", -1, operation=operation, **labels)
+
+
+@contextmanager
+def _noop():
+    yield
+
+
+def track(operation: str, **labels):
+    """
+    Context manager recording the latency, in-flight count and errors of `operation`.
+    """
+    if not METRICS.enabled:
+        return _noop()
+    return _track(operation, labels)
+
+
+def instrumented(operation: str):
+    """
+    Decorator tracking every call of a sync or async function as `operation`.
+    """
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not METRICS.enabled:
+                    return await func(*args, **kwargs)
+                with _track(operation, {}):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not METRICS.enabled:
+                return func(*args, **kwargs)
+            with _track(operation, {}):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def serve_prometheus(port: int = 9464, addr: str = "0.0.0.0"):
+    """
+    Serve the metrics in the Prometheus text format on `/metrics` from a daemon thread.
+    Returns the HTTP server, call `shutdown` on it to stop serving.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            content = METRICS.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((addr, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="MetricsServer", daemon=True).start()
+    return server
@@ -7,11 +7,17 @@ This module provides utilities to assist with registering nodes in a Dapr state
 import logging
 import json
 import os
+import time
+import zlib
+import random
+import threading
 from dapr.clients import DaprClient
 from dapr.clients.grpc._state import StateOptions, Concurrency, Consistency
+from dapr.clients.grpc._request import TransactionalStateOperation, TransactionOperationType
 
 # Set up logging
 from bud_ecosystem_utils.logger import setup_logger
+from bud_ecosystem_utils.metrics import instrumented, record_retry
 
 logger = setup_logger(__name__, logging.DEBUG)
 
@@ -19,7 +25,21 @@ logger = setup_logger(__name__, logging.DEBUG)
 # Constants for state store and service registry
 STORE_NAME = os.getenv("BUD_STATE_STORE", "bud-state-store")
 SERVICE_REGISTRY_KEY = os.getenv("BUD_SERVICE_REGISTRY_KEY", "service-registry")
+# Number of keys the service registry is sharded over, 0 keeps the legacy single
+# `SERVICE_REGISTRY_KEY` list that services outside this package may read directly
+SERVICE_REGISTRY_SHARDS = int(os.getenv("BUD_SERVICE_REGISTRY_SHARDS", 0))
 
+# Retry policy for registry writes
+REGISTRY_MAX_RETRIES = int(os.getenv("BUD_REGISTRY_MAX_RETRIES", 10))
+REGISTRY_BASE_BACKOFF = float(os.getenv("BUD_REGISTRY_BASE_BACKOFF", 0.05))
+REGISTRY_MAX_BACKOFF = float(os.getenv("BUD_REGISTRY_MAX_BACKOFF", 5))
+
+# Time in seconds a discovered node is served from the local cache before revalidation
+DISCOVERY_CACHE_TTL = float(os.getenv("BUD_DISCOVERY_CACHE_TTL", 30))
+# Unknown topics are only remembered briefly so nodes registering later become routable quickly
+DISCOVERY_MISS_TTL = float(os.getenv("BUD_DISCOVERY_MISS_TTL", 1))
+
+@instrumented("node.store_node")
 def store_node(client: DaprClient, node_info: dict) -> None:
     """
     Save node information to a Dapr state store.
@@ -51,6 +71,43 @@ def store_node(client: DaprClient, node_info: dict) -> None:
         logger.error(f"Error in store_node: {str(e)}")
         raise e
 
+def get_registry_shard_key(job_topic: str) -> str:
+    """
+    Return the service registry key holding `job_topic`.
+
+    When `SERVICE_REGISTRY_SHARDS` is set, topics are spread over that many keys by a
+    stable hash so that nodes starting together don't all contend on a single key.
+    Otherwise every topic lives in the legacy `SERVICE_REGISTRY_KEY` list.
+    """
+    if SERVICE_REGISTRY_SHARDS <= 0:
+        return SERVICE_REGISTRY_KEY
+    shard = zlib.crc32(job_topic.encode("utf-8")) % SERVICE_REGISTRY_SHARDS
+    return f"{SERVICE_REGISTRY_KEY}-{shard}"
+
+
+def get_registry_shard_keys() -> list:
+    return [f"{SERVICE_REGISTRY_KEY}-{shard}" for shard in range(SERVICE_REGISTRY_SHARDS)]
+
+
+def _retry_with_backoff(func, name: str):
+    """
+    Call `func` until it succeeds, sleeping with jittered exponential backoff between
+    attempts. The last error is raised once `REGISTRY_MAX_RETRIES` retries are exhausted.
+    """
+    for attempt in range(REGISTRY_MAX_RETRIES + 1):
+        try:
+            return func()
+        except Exception as e:
+            if attempt == REGISTRY_MAX_RETRIES:
+                logger.error(f"Error in {name}, giving up after {attempt + 1} attempts: {str(e)}")
+                raise e
+            delay = random.uniform(0, min(REGISTRY_MAX_BACKOFF, REGISTRY_BASE_BACKOFF * 2 ** attempt))
+            logger.warning(f"Error in {name}, retrying in {delay:.3f}s: {str(e)}")
+            record_retry(f"node.{name}")
+            time.sleep(delay)
+
+
+@instrumented("node.update_service_registry")
 def update_service_registry(client: DaprClient, job_topic: str) -> None:
     """
     Update the service registry in the Dapr state store with the given job_topic.
@@ -59,39 +116,58 @@ def update_service_registry(client: DaprClient, job_topic: str) -> None:
         client (DaprClient): The Dapr client instance.
         job_topic (str): The topic related to the job.
 
+    Raises:
+        Exception: If the registry couldn't be updated within `REGISTRY_MAX_RETRIES` retries.
     """
-    while True:
-        try:
-            service_registry_state = client.get_state(
-                store_name=STORE_NAME,
-                key=SERVICE_REGISTRY_KEY,
-            )
+    shard_key = get_registry_shard_key(job_topic)
 
-            keys_data = service_registry_state.data or b"[]"
-            keys = json.loads(keys_data.decode("utf-8"))
-            etag = service_registry_state.etag
+    def _update():
+        service_registry_state = client.get_state(
+            store_name=STORE_NAME,
+            key=shard_key,
+        )
+
+        keys_data = service_registry_state.data or b"[]"
+        keys = json.loads(keys_data.decode("utf-8"))
+        if job_topic in keys:
+            return
+
+        keys.append(job_topic)
+        client.save_state(
+            store_name=STORE_NAME,
+            key=shard_key,
+            value=json.dumps(keys),
+            etag=service_registry_state.etag,
+            options=StateOptions(
+                concurrency=Concurrency.first_write,
+                consistency=Consistency.strong,
+            ),
+        )
+        logger.info(f"State Updated For Registry {shard_key}")
 
-            logger.info(f"Current Keys: {keys}")
+    _retry_with_backoff(_update, "update_service_registry")
 
-            if job_topic not in keys:
-                keys.append(job_topic)
 
+def _create_registry_shards(client: DaprClient, shard_keys: list) -> None:
+    """
+    Create the given registry shards as empty lists with first-write saves, so that they
+    carry an etag the registry updates can be checked against. A shard created by another
+    writer in between is left untouched.
+    """
+    for shard_key in shard_keys:
+        try:
             client.save_state(
                 store_name=STORE_NAME,
-                key=SERVICE_REGISTRY_KEY,
-                value=json.dumps(keys),
-                etag=etag,
+                key=shard_key,
+                value=json.dumps([]),
                 options=StateOptions(
                     concurrency=Concurrency.first_write,
                     consistency=Consistency.strong,
                 ),
             )
-            logger.info("State Updated For Registries")
-            break
-
         except Exception as e:
-            logger.error(f"Error in update_service_registry: {str(e)}")
-            continue
+            logger.debug(f"Registry shard {shard_key} not created: {str(e)}")
+
 
 def register_node(client: DaprClient, node_info: dict)->None:
     """
@@ -116,3 +192,174 @@ def register_node(client: DaprClient, node_info: dict)->None:
     except Exception as e:
         logger.error(f"Error in register_node: {str(e)}")
         raise e
+
+
+@instrumented("node.register_nodes")
+def register_nodes(client: DaprClient, nodes_info: list) -> None:
+    """
+    Register several nodes in the Dapr state store within a single transaction.
+
+    The node states and the registry shards they belong to are written together, the
+    transaction is retried with backoff if another writer updated a shard in between.
+    Missing shards are created first so that every shard update is checked against an etag.
+
+    Args:
+        client (DaprClient): The Dapr client instance.
+        nodes_info (list): Dictionaries containing the node information, see `register_node`.
+
+    Raises:
+        KeyError: If any of the nodes is missing its 'topic'.
+    """
+    try:
+        topics_by_shard = {}
+        for node_info in nodes_info:
+            topic = node_info["topic"]
+            topics_by_shard.setdefault(get_registry_shard_key(topic), []).append(topic)
+    except KeyError:
+        logger.error("Required keys missing in node_info.")
+        raise Exception("Required keys missing in node_info.")
+
+    def _get_shard_states():
+        items = client.get_bulk_state(store_name=STORE_NAME, keys=list(topics_by_shard.keys())).items
+        return {item.key: item for item in items if item.etag}
+
+    def _register():
+        operations = [
+            TransactionalStateOperation(
+                key=node_info["topic"],
+                data=json.dumps(node_info),
+                operation_type=TransactionOperationType.upsert,
+            )
+            for node_info in nodes_info
+        ]
+        shard_states = _get_shard_states()
+        # Transactions can't express first-write on a missing key, create the shards beforehand
+        new_shards = [key for key in topics_by_shard if key not in shard_states]
+        if new_shards:
+            _create_registry_shards(client, new_shards)
+            shard_states = _get_shard_states()
+            new_shards = [key for key in topics_by_shard if key not in shard_states]
+            if new_shards:
+                raise Exception(f"Registry shards {new_shards} could not be created")
+
+        for shard_key, topics in topics_by_shard.items():
+            shard_state = shard_states[shard_key]
+            keys = json.loads((shard_state.data or b"[]").decode("utf-8"))
+            missing = [topic for topic in dict.fromkeys(topics) if topic not in keys]
+            if not missing:
+                continue
+            operations.append(
+                TransactionalStateOperation(
+                    key=shard_key,
+                    data=json.dumps(keys + missing),
+                    etag=shard_state.etag,
+                    operation_type=TransactionOperationType.upsert,
+                )
+            )
+
+        client.execute_state_transaction(store_name=STORE_NAME, operations=operations)
+        logger.info(f"Registered {len(nodes_info)} nodes across {len(topics_by_shard)} registry shards.")
+
+    _retry_with_backoff(_register, "register_nodes")
+
+
+def get_registered_topics(client: DaprClient) -> list:
+    """
+    Read every topic in the service registry with a single bulk state read.
+
+    The legacy `SERVICE_REGISTRY_KEY` list is always read alongside the shards, so
+    topics registered before sharding was enabled are included as well.
+
+    Args:
+        client (DaprClient): The Dapr client instance.
+
+    Returns:
+        list: The registered topics.
+    """
+    topics = []
+    items = client.get_bulk_state(
+        store_name=STORE_NAME,
+        keys=[SERVICE_REGISTRY_KEY] + get_registry_shard_keys(),
+    ).items
+    for item in items:
+        if item.data:
+            topics.extend(json.loads(item.data.decode("utf-8")))
+    return list(dict.fromkeys(topics))
+
+
+class NodeDiscovery:
+    """
+    Resolve node information stored with `store_node` through a local read-through cache.
+
+    Cache misses are fetched together with a single Dapr bulk state read. Entries older than
+    `ttl` seconds are revalidated the same way, the cached node is kept as is when the etag
+    in the state store hasn't changed. Unknown topics resolve to `None` and are only
+    cached for `miss_ttl` seconds.
+
+    Args:
+        client (DaprClient): The Dapr client instance.
+        ttl (float): Seconds an entry is served from the cache before it is revalidated.
+        miss_ttl (float): Seconds an unknown topic is cached, 0 disables caching misses.
+    """
+
+    def __init__(
+        self, client: DaprClient, ttl: float = DISCOVERY_CACHE_TTL, miss_ttl: float = DISCOVERY_MISS_TTL
+    ) -> None:
+        self.client = client
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def get_node(self, topic: str):
+        return self.get_nodes([topic])[topic]
+
+    def get_nodes(self, topics: list) -> dict:
+        """
+        Resolve several topics, returns a dict mapping each topic to its node information.
+        """
+        now = time.monotonic()
+        nodes = {}
+        stale = []
+        with self._lock:
+            for topic in dict.fromkeys(topics):
+                entry = self._cache.get(topic)
+                if entry is not None and now - entry[2] < (self.ttl if entry[0] is not None else self.miss_ttl):
+                    nodes[topic] = entry[0]
+                else:
+                    stale.append(topic)
+
+        if stale:
+            nodes.update(self._fetch(stale))
+        return nodes
+
+    def list_nodes(self) -> dict:
+        """Resolve every topic in the service registry."""
+        return self.get_nodes(get_registered_topics(self.client))
+
+    def invalidate(self, topic: str = None) -> None:
+        with self._lock:
+            if topic is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(topic, None)
+
+    def _fetch(self, topics: list) -> dict:
+        items = self.client.get_bulk_state(store_name=STORE_NAME, keys=topics).items
+        fetched_at = time.monotonic()
+        nodes = {topic: None for topic in topics}
+        returned = {item.key for item in items}
+        with self._lock:
+            for item in items:
+                entry = self._cache.get(item.key)
+                if entry is not None and item.etag and entry[1] == item.etag:
+                    node = entry[0]
+                else:
+                    node = json.loads(item.data.decode("utf-8")) if item.data else None
+                self._cache[item.key] = (node, item.etag, fetched_at)
+                nodes[item.key] = node
+            for topic in topics:
+                if topic not in returned:
+                    self._cache[topic] = (None, None, fetched_at)
+        logger.debug(f"Resolved {len(topics)} nodes from the state store.")
+        return nodes
@@ -0,0 +1,161 @@
+"""
+Utils for encoding large event and callback payloads.
+
+Payloads can be encoded either as plain JSON or in a compact binary form (msgpack
+compressed with zlib), the encoding is signalled through the content type. The
+`data` of a payload larger than the offload threshold is stored through
+`BlobService` and replaced by a reference (claim-check pattern), consumers call
+`unpack_payload` or `resolve_data` to fetch it back transparently.
+
+Offloaded data is stored under `PAYLOAD_CLAIM_CHECK_PREFIX` and is not removed by the
+producer. Either configure a lifecycle rule expiring that prefix on the bucket, or have
+the consumers resolve with `delete_after_resolve` when every payload is consumed once.
+"""
+
+import os
+import json
+import zlib
+import asyncio
+
+
+JSON_CONTENT_TYPE = "application/json"
+COMPACT_CONTENT_TYPE = "application/x-msgpack+zlib"
+CLAIM_CHECK_KEY = "$claim_check"
+CLAIM_CHECK_BLOB_PREFIX = os.getenv("PAYLOAD_CLAIM_CHECK_PREFIX", "claim-check")
+
+# Size in bytes of the encoded data above which it is offloaded to blob storage, 0 disables it
+PAYLOAD_OFFLOAD_THRESHOLD = int(os.getenv("PAYLOAD_OFFLOAD_THRESHOLD", 0))
+PAYLOAD_COMPACT_ENCODING = os.getenv("PAYLOAD_COMPACT_ENCODING", "").lower() in ("1", "true", "yes")
+# Delete offloaded data once it has been fetched back
+PAYLOAD_DELETE_AFTER_RESOLVE = os.getenv("PAYLOAD_DELETE_AFTER_RESOLVE", "").lower() in ("1", "true", "yes")
+
+
+def encode(content, compact: bool = False):
+    """Encode `content`, returns the encoded bytes and their content type."""
+    if compact:
+        import msgpack
+
+        return zlib.compress(msgpack.packb(content, use_bin_type=True)), COMPACT_CONTENT_TYPE
+    return json.dumps(content).encode("utf-8"), JSON_CONTENT_TYPE
+
+
+def decode(content, content_type: str = JSON_CONTENT_TYPE):
+    if content_type == COMPACT_CONTENT_TYPE:
+        import msgpack
+
+        return msgpack.unpackb(zlib.decompress(content), raw=False)
+    if isinstance(content, (bytes, bytearray)):
+        content = content.decode("utf-8")
+    return json.loads(content)
+
+
+def is_claim_check(data) -> bool:
+    return isinstance(data, dict) and CLAIM_CHECK_KEY in data
+
+
+def offload_data(payload: dict, offload_threshold: int = None, compact: bool = None, blob_service=None) -> dict:
+    """
+    Store `payload["data"]` through `BlobService` when its encoded size exceeds
+    `offload_threshold` bytes, returns the payload with the data replaced by a reference.
+    """
+    offload_threshold = PAYLOAD_OFFLOAD_THRESHOLD if offload_threshold is None else offload_threshold
+    compact = PAYLOAD_COMPACT_ENCODING if compact is None else compact
+    if not offload_threshold or payload.get("data") is None:
+        return payload
+
+    content, content_type = encode(payload["data"], compact=compact)
+    if len(content) <= offload_threshold:
+        return payload
+    return dict(payload, data=_store_data(content, content_type, blob_service))
+
+
+def _store_data(content, content_type, blob_service=None) -> dict:
+    from bud_ecosystem_utils.blob import BlobService
+
+    blob_service = blob_service or BlobService()
+    url = f"{blob_service.get_blob_path()}{CLAIM_CHECK_BLOB_PREFIX}/{BlobService.get_unique_key()}"
+    blob_service.write_file(url, content)
+    return {CLAIM_CHECK_KEY: {"url": url, "content_type": content_type, "size": len(content)}}
+
+
+def resolve_data(data, blob_service=None, delete_after_resolve: bool = None):
+    """
+    Fetch the data referenced by a claim-check, any other data is returned as is.
+    With `delete_after_resolve` the stored data is deleted once fetched.
+    """
+    if not is_claim_check(data):
+        return data
+
+    from bud_ecosystem_utils.blob import BlobService
+
+    delete_after_resolve = PAYLOAD_DELETE_AFTER_RESOLVE if delete_after_resolve is None else delete_after_resolve
+    reference = data[CLAIM_CHECK_KEY]
+    blob_service = blob_service or BlobService()
+    content = blob_service.read_file(reference["url"])
+    if delete_after_resolve:
+        blob_service.delete_file(reference["url"])
+    return decode(content, reference["content_type"])
+
+
+def pack_payload(payload: dict, compact: bool = None, offload_threshold: int = None, blob_service=None):
+    """
+    Encode a payload for publishing, offloading its data if the payload is too large.
+
+    Args:
+        payload (dict): The payload, only its `data` field is ever offloaded.
+        compact (bool): Use the compact binary encoding instead of JSON.
+        offload_threshold (int): Size in bytes of the encoded payload above which its
+                                 data is offloaded, 0 disables it.
+        blob_service (BlobService): Service used to store offloaded data.
+
+    Returns:
+        tuple: The encoded payload and its content type.
+    """
+    compact = PAYLOAD_COMPACT_ENCODING if compact is None else compact
+    offload_threshold = PAYLOAD_OFFLOAD_THRESHOLD if offload_threshold is None else offload_threshold
+    content, content_type = _encode_payload(payload, compact)
+    if not offload_threshold or len(content) <= offload_threshold or payload.get("data") is None:
+        return content, content_type
+
+    data_content, data_content_type = encode(payload["data"], compact=compact)
+    payload = dict(payload, data=_store_data(data_content, data_content_type, blob_service))
+    return _encode_payload(payload, compact)
+
+
+def _encode_payload(payload, compact):
+    if compact:
+        return encode(payload, compact=True)
+    return json.dumps(payload), JSON_CONTENT_TYPE
+
+
+def is_packing_enabled(compact: bool = None, offload_threshold: int = None) -> bool:
+    """Whether `pack_payload` would do more than plain JSON encoding with these options."""
+    compact = PAYLOAD_COMPACT_ENCODING if compact is None else compact
+    offload_threshold = PAYLOAD_OFFLOAD_THRESHOLD if offload_threshold is None else offload_threshold
+    return bool(compact or offload_threshold)
+
+
+async def pack_payload_async(payload: dict, compact: bool = None, offload_threshold: int = None, blob_service=None):
+    """
+    asyncio counterpart of `pack_payload`, the encoding and any blob upload only run in
+    a worker thread when compact encoding or offloading is enabled.
+    """
+    if not is_packing_enabled(compact, offload_threshold):
+        return json.dumps(payload), JSON_CONTENT_TYPE
+    return await asyncio.to_thread(
+        pack_payload, payload, compact=compact, offload_threshold=offload_threshold, blob_service=blob_service
+    )
+
+
+def unpack_payload(
+    content, content_type: str = JSON_CONTENT_TYPE, blob_service=None, delete_after_resolve: bool = None
+) -> dict:
+    """
+    Decode a payload produced by `pack_payload`, fetching offloaded data transparently.
+    """
+    payload = decode(content, content_type)
+    if isinstance(payload, dict) and is_claim_check(payload.get("data")):
+        payload["data"] = resolve_data(
+            payload["data"], blob_service=blob_service, delete_after_resolve=delete_after_resolve
+        )
+    return payload
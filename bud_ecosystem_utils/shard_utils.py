@@ -0,0 +1,195 @@
+"""
+Utils for packing datasets into fixed-size shards.
+
+A packed dataset is a directory holding a `manifest.json`, a compact binary
+`index.bin` and a set of `shard-XXXXX.bin` files. Every record in a shard is
+its JSON encoded metadata followed by the raw bytes of its image (if any), the
+index stores where each record lives so it can be read by random access
+through a memory-mapped shard instead of opening loose files.
+"""
+
+import os
+import json
+import mmap
+import struct
+from pathlib import Path
+from tqdm import tqdm
+
+from bud_ecosystem_utils.data_utils import load_metadata
+
+
+MANIFEST_FILENAME = "manifest.json"
+INDEX_FILENAME = "index.bin"
+SHARD_FILENAME = "shard-{:05d}.bin"
+DEFAULT_SHARD_SIZE = int(os.environ.get("BUD_DATASET_SHARD_SIZE", 256 * 1024 * 1024))
+
+# shard id, offset, metadata length, image length
+INDEX_ENTRY = struct.Struct("<IQII")
+
+
+def _resolve_image_path(dataset_dir, image_path):
+    if os.path.isabs(image_path):
+        return image_path
+    return os.path.join(dataset_dir, "images", image_path)
+
+
+def pack_dataset(dataset_dir: str, save_dir: str, image_column: str = None, shard_size: int = None):
+    """
+    Pack a local dataset into shards.
+
+    Args:
+        dataset_dir (str): Directory with a metadata file and optionally an `images` folder.
+        save_dir (str): Directory to write the manifest, index and shards to.
+        image_column (str): Metadata column holding the image path, the image bytes are
+                            stored alongside the record when given.
+        shard_size (int): Approximate size in bytes after which a new shard is started.
+
+    Returns:
+        str: The directory containing the packed dataset.
+    """
+    shard_size = shard_size or DEFAULT_SHARD_SIZE
+    metadata = load_metadata(dataset_dir)
+    Path(save_dir).mkdir(parents=True, exist_ok=True)
+
+    shards = []
+    shard_id = -1
+    shard_file = None
+    offset = shard_size
+
+    with open(os.path.join(save_dir, INDEX_FILENAME), "wb") as index_file:
+        try:
+            for data in tqdm(metadata):
+                content = b""
+                if image_column is not None:
+                    if image_column not in data:
+                        raise ValueError(f"Image column '{image_column}' missing in {data}")
+                    with open(_resolve_image_path(dataset_dir, data[image_column]), "rb") as fin:
+                        content = fin.read()
+                    data = dict(data, **{image_column: os.path.basename(data[image_column])})
+                record = json.dumps(data).encode("utf-8")
+
+                if offset >= shard_size:
+                    if shard_file is not None:
+                        shard_file.close()
+                    shard_id += 1
+                    shards.append(SHARD_FILENAME.format(shard_id))
+                    shard_file = open(os.path.join(save_dir, shards[-1]), "wb")
+                    offset = 0
+
+                shard_file.write(record)
+                shard_file.write(content)
+                index_file.write(INDEX_ENTRY.pack(shard_id, offset, len(record), len(content)))
+                offset += len(record) + len(content)
+        finally:
+            if shard_file is not None:
+                shard_file.close()
+
+    with open(os.path.join(save_dir, MANIFEST_FILENAME), "w") as fout:
+        json.dump(
+            {
+                "num_records": len(metadata),
+                "image_column": image_column,
+                "shards": shards,
+                "index": INDEX_FILENAME,
+            },
+            fout,
+        )
+    return save_dir
+
+
+class ShardedDataset:
+    """
+    Random access reader for a dataset written by `pack_dataset`.
+
+    Indexing returns the record metadata, with the image bytes under `image_column`
+    when the dataset was packed with images. Shards are memory-mapped lazily.
+    """
+
+    def __init__(self, dataset_dir: str) -> None:
+        self.dataset_dir = dataset_dir
+        with open(os.path.join(dataset_dir, MANIFEST_FILENAME), "r") as fin:
+            self.manifest = json.load(fin)
+        self.image_column = self.manifest["image_column"]
+        with open(os.path.join(dataset_dir, self.manifest["index"]), "rb") as fin:
+            self.index = fin.read()
+        self._files = {}
+        self._maps = {}
+
+    def __len__(self):
+        return len(self.index) // INDEX_ENTRY.size
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _get_shard(self, shard_id):
+        if shard_id not in self._maps:
+            path = os.path.join(self.dataset_dir, self.manifest["shards"][shard_id])
+            self._files[shard_id] = open(path, "rb")
+            self._maps[shard_id] = mmap.mmap(self._files[shard_id].fileno(), 0, access=mmap.ACCESS_READ)
+        return self._maps[shard_id]
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("ShardedDataset index out of range")
+
+        shard_id, offset, record_len, content_len = INDEX_ENTRY.unpack_from(
+            self.index, idx * INDEX_ENTRY.size
+        )
+        shard = self._get_shard(shard_id)
+        data = json.loads(shard[offset:offset + record_len].decode("utf-8"))
+        if self.image_column is not None:
+            start = offset + record_len
+            data[self.image_column] = shard[start:start + content_len]
+        return data
+
+    def close(self):
+        for shard in self._maps.values():
+            shard.close()
+        for file in self._files.values():
+            file.close()
+        self._maps = {}
+        self._files = {}
+
+
+def upload_sharded_dataset(dataset_dir: str, base_key: str, blob_service=None):
+    """Upload the manifest, index and shards of a packed dataset, returns the remote prefix."""
+    from bud_ecosystem_utils.blob import BlobService
+
+    blob_service = blob_service or BlobService()
+    base_key = base_key.strip("/")
+    with open(os.path.join(dataset_dir, MANIFEST_FILENAME), "r") as fin:
+        manifest = json.load(fin)
+
+    for filename in tqdm(manifest["shards"] + [manifest["index"]]):
+        blob_service.upload_file(f"{base_key}/{filename}", filepath=os.path.join(dataset_dir, filename))
+    # The manifest goes last so a partially uploaded dataset is never picked up
+    url = blob_service.upload_file(
+        f"{base_key}/{MANIFEST_FILENAME}", filepath=os.path.join(dataset_dir, MANIFEST_FILENAME)
+    )
+    return url[: -len(MANIFEST_FILENAME)]
+
+
+def download_sharded_dataset(blob_url: str, save_dir: str, blob_service=None):
+    """Download a packed dataset given its remote prefix or manifest url, returns the local dir."""
+    from bud_ecosystem_utils.blob import BlobService
+
+    blob_service = blob_service or BlobService()
+    prefix = blob_url[: -len(MANIFEST_FILENAME)] if blob_url.endswith(MANIFEST_FILENAME) else blob_url
+    prefix = prefix.rstrip("/") + "/"
+
+    blob_service.download_file(prefix + MANIFEST_FILENAME, save_dir, extract_files=False)
+    with open(os.path.join(save_dir, MANIFEST_FILENAME), "r") as fin:
+        manifest = json.load(fin)
+
+    for filename in tqdm([manifest["index"]] + manifest["shards"]):
+        blob_service.download_file(prefix + filename, save_dir, extract_files=False)
+    return save_dir
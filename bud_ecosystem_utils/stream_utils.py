@@ -0,0 +1,183 @@
+"""
+Utils for streaming datasets straight from blob storage.
+
+`StreamingDataset` reads the metadata of a remote dataset and yields its records
+while a background pool fetches the images ahead of the consumer, so training
+can start on the first batch while the rest is still arriving. Images are read
+either from loose `images/` objects or, for datasets uploaded as an archive, as
+ranged reads of their members inside `images.zip`.
+"""
+
+import os
+import zlib
+import struct
+import zipfile
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from bud_ecosystem_utils.blob import BlobService, DEFAULT_MAX_WORKERS
+from bud_ecosystem_utils.data_utils import load_metadata
+from bud_ecosystem_utils.metrics import record_bytes
+
+
+METADATA_FILENAMES = ["metadata.jsonl", "metadata.json", "metadata.txt"]
+DEFAULT_READ_AHEAD = int(os.environ.get("BUD_STREAM_READ_AHEAD", 64))
+IMAGE_ARCHIVE_FILENAME = "images.zip"
+
+# Fixed part of a zip local file header, the name and extra field lengths are its last two fields
+ZIP_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+
+
+class StreamingDataset:
+    """
+    Iterate over a remote dataset laid out as `<prefix>/metadata.jsonl` with its images
+    either under `<prefix>/images/` or packed in `<prefix>/images.zip`.
+
+    Args:
+        blob_url (str): Remote prefix of the dataset or url of its metadata file.
+        image_column (str): Metadata column holding the image path relative to `images/`,
+                            the image bytes replace the path in the yielded record.
+        read_ahead (int): Maximum number of records fetched ahead of the consumer, this
+                          bounds the number of images held in memory.
+        max_workers (int): Number of background threads fetching images.
+        blob_service (BlobService): Service used to read the remote objects.
+    """
+
+    def __init__(
+        self,
+        blob_url: str,
+        image_column: str = None,
+        read_ahead: int = None,
+        max_workers: int = None,
+        blob_service: BlobService = None,
+    ) -> None:
+        self.blob_service = blob_service or BlobService()
+        self.image_column = image_column
+        self.read_ahead = read_ahead or DEFAULT_READ_AHEAD
+        self.max_workers = max_workers or min(DEFAULT_MAX_WORKERS, self.read_ahead)
+        self.client = self.blob_service.get_blob_client(
+            self.blob_service.get_provider_from_url(blob_url), max_connections=self.max_workers
+        )
+        self.archive_url = None
+        self.archive_members = None
+        self._local = threading.local()
+        self._handles = []
+        self._handles_lock = threading.Lock()
+
+        if os.path.basename(blob_url) in METADATA_FILENAMES:
+            self.prefix = blob_url[: -len(os.path.basename(blob_url))]
+            self.metadata = self._load_remote_metadata(blob_url)
+        else:
+            self.prefix = blob_url.rstrip("/") + "/"
+            self.metadata = self._find_remote_metadata()
+
+        if self.image_column is not None:
+            self._find_remote_images()
+
+    def _load_remote_metadata(self, metadata_url):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            metadata_path = self.blob_service.download_file(
+                metadata_url, tmp_dir, extract_files=False, client=self.client
+            )
+            return load_metadata(metadata_path)
+
+    def _find_remote_metadata(self):
+        urls = set(self.blob_service.list_blobs(self.prefix + "metadata", client=self.client))
+        for filename in METADATA_FILENAMES:
+            if self.prefix + filename in urls:
+                return self._load_remote_metadata(self.prefix + filename)
+        raise FileNotFoundError(f"Couldn't find any metadata file at '{self.prefix}'")
+
+    def _find_remote_images(self):
+        urls = self.blob_service.list_blobs(self.prefix + "images", client=self.client)
+        has_archive = False
+        for url in urls:
+            if url.startswith(self.prefix + "images/"):
+                return
+            has_archive = has_archive or url == self.prefix + IMAGE_ARCHIVE_FILENAME
+        if not has_archive:
+            raise FileNotFoundError(
+                f"Couldn't find any images at '{self.prefix}images/' or '{self.prefix}{IMAGE_ARCHIVE_FILENAME}'"
+            )
+
+        # Only the central directory is read here, members are fetched with ranged reads later
+        self.archive_url = self.prefix + IMAGE_ARCHIVE_FILENAME
+        with self.blob_service.open_file(self.archive_url, client=self.client) as fin:
+            with zipfile.ZipFile(fin) as archive:
+                self.archive_members = {info.filename: info for info in archive.infolist()}
+
+    def __len__(self):
+        return len(self.metadata)
+
+    def _read_archive_member(self, name):
+        info = self.archive_members.get(name)
+        if info is None:
+            raise FileNotFoundError(f"'{name}' missing in '{self.archive_url}'")
+        if info.compress_type not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            raise NotImplementedError(f"Unsupported compression for '{name}' in '{self.archive_url}'")
+
+        # Every worker thread keeps its own handle on the archive
+        fin = getattr(self._local, "archive", None)
+        if fin is None:
+            fin = self._local.archive = self.blob_service.open_file(self.archive_url, client=self.client)
+            with self._handles_lock:
+                self._handles.append(fin)
+        fin.seek(info.header_offset)
+        header = ZIP_LOCAL_HEADER.unpack(fin.read(ZIP_LOCAL_HEADER.size))
+        fin.seek(header[-2] + header[-1], os.SEEK_CUR)
+        content = fin.read(info.compress_size)
+        record_bytes("blob.read_range", len(content))
+
+        if info.compress_type == zipfile.ZIP_DEFLATED:
+            content = zlib.decompress(content, -zlib.MAX_WBITS)
+        return content
+
+    def _fetch(self, data):
+        if self.image_column is None:
+            return data
+        if self.image_column not in data:
+            raise ValueError(f"Image column '{self.image_column}' missing in {data}")
+        image_path = data[self.image_column].lstrip("/")
+        if self.archive_url is not None:
+            content = self._read_archive_member(image_path)
+        else:
+            content = self.blob_service.read_file(f"{self.prefix}images/{image_path}", client=self.client)
+        return dict(data, **{self.image_column: content})
+
+    def __iter__(self):
+        records = iter(self.metadata)
+        pending = deque()
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                try:
+                    for data in records:
+                        pending.append(executor.submit(self._fetch, data))
+                        if len(pending) >= self.read_ahead:
+                            yield pending.popleft().result()
+                    while pending:
+                        yield pending.popleft().result()
+                finally:
+                    for future in pending:
+                        future.cancel()
+        finally:
+            # Also reached when the consumer stops early, once the workers are done
+            self._close_handles()
+
+    def _close_handles(self):
+        with self._handles_lock:
+            handles, self._handles = self._handles, []
+        for fin in handles:
+            fin.close()
+        self._local = threading.local()
+
+    def iter_batches(self, batch_size: int):
+        batch = []
+        for data in self:
+            batch.append(data)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
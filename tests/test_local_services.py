@@ -0,0 +1,98 @@
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from bud_ecosystem_utils.local_services import EtagMismatchError, LocalDaprClient
+
+
+FIRST_WRITE = SimpleNamespace(concurrency=SimpleNamespace(name="first_write"))
+STORE = "bud-state-store"
+
+
+def test_first_write_without_etag_conflicts_on_existing_key():
+    client = LocalDaprClient()
+    client.save_state(STORE, "key", "a", options=FIRST_WRITE)
+
+    with pytest.raises(EtagMismatchError):
+        client.save_state(STORE, "key", "b", options=FIRST_WRITE)
+    assert client.get_state(STORE, "key").data == b"a"
+    assert client.conflicts == 1
+
+
+def test_racing_read_modify_write_on_missing_key_conflicts():
+    client = LocalDaprClient()
+    first = client.get_state(STORE, "registry")
+    second = client.get_state(STORE, "registry")
+
+    client.save_state(STORE, "registry", json.dumps(["a"]), etag=first.etag, options=FIRST_WRITE)
+    with pytest.raises(EtagMismatchError):
+        client.save_state(STORE, "registry", json.dumps(["b"]), etag=second.etag, options=FIRST_WRITE)
+    assert client.conflicts == 1
+
+
+def test_stale_etag_conflicts_and_last_write_without_etag_succeeds():
+    client = LocalDaprClient()
+    client.save_state(STORE, "key", "a")
+    etag = client.get_state(STORE, "key").etag
+    client.save_state(STORE, "key", "b", etag=etag)
+
+    with pytest.raises(EtagMismatchError):
+        client.save_state(STORE, "key", "c", etag=etag, options=FIRST_WRITE)
+    client.save_state(STORE, "key", "d")
+    assert client.get_state(STORE, "key").data == b"d"
+
+
+def test_transaction_is_rejected_as_a_whole_on_etag_mismatch():
+    client = LocalDaprClient()
+    client.save_state(STORE, "shard", "[]")
+    operations = [
+        SimpleNamespace(key="node", data="{}", etag=None, operation_type="upsert"),
+        SimpleNamespace(key="shard", data='["node"]', etag="stale", operation_type="upsert"),
+    ]
+
+    with pytest.raises(EtagMismatchError):
+        client.execute_state_transaction(STORE, operations)
+    assert "node" not in client.state
+
+
+def test_concurrent_update_service_registry_keeps_every_topic():
+    pytest.importorskip("dapr")
+    pytest.importorskip("elasticapm")
+    from bud_ecosystem_utils import node_utils
+
+    client = LocalDaprClient(latency=0.001)
+    topics = [f"topic-{idx}" for idx in range(16)]
+    threads = [
+        threading.Thread(target=node_utils.update_service_registry, args=(client, topic))
+        for topic in topics
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(node_utils.get_registered_topics(client)) == sorted(topics)
+
+
+@pytest.mark.parametrize("shards", [0, 4])
+def test_concurrent_register_nodes_keeps_every_topic(monkeypatch, shards):
+    pytest.importorskip("dapr")
+    pytest.importorskip("elasticapm")
+    from bud_ecosystem_utils import node_utils
+
+    monkeypatch.setattr(node_utils, "SERVICE_REGISTRY_SHARDS", shards)
+    client = LocalDaprClient(latency=0.001)
+    batches = [
+        [{"name": f"node-{idx}-{jdx}", "type": "test", "topic": f"topic-{idx}-{jdx}"} for jdx in range(4)]
+        for idx in range(8)
+    ]
+    threads = [threading.Thread(target=node_utils.register_nodes, args=(client, nodes)) for nodes in batches]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    topics = [node["topic"] for nodes in batches for node in nodes]
+    assert sorted(node_utils.get_registered_topics(client)) == sorted(topics)